@@ -21,6 +21,29 @@ CORS(app)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
 MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB
+PYRAMID_MIN_DIMENSION = 256  # Coarsest pyramid level is at least this size
+# Block size at the finest level; halved per level so every block covers the
+# same 32x32 area of the full-resolution image
+PYRAMID_BLOCK_SIZE = 32
+HIGH_PASS_KERNEL_ENERGY = 72.0  # Sum of squared 3x3 high-pass kernel taps
+NOISE_FLAT_RATIO = 1.2  # Max spaced-out/fine residual energy for a flat block
+NOISE_MIN_FLAT_BLOCKS = 8  # Fewer flat blocks than this cannot be judged
+# Spread of log2 noise variance between PYRAMID_BLOCK_SIZE blocks of uniform
+# noise; smaller blocks are noisier estimates and scale it up accordingly
+NOISE_ESTIMATE_SPREAD = 0.1
+# Rank of the outlier block that is reported, so one odd block never scores
+NOISE_OUTLIER_RANK = 2
+# Relative margin below the lowest threshold before a coarse result is final
+COARSE_TO_FINE_MARGIN = 0.6
+
+# Scoring thresholds, shared by the scoring and coarse-to-fine early exit.
+# Noise: robust z-score of the outlier block around the noise/brightness fit
+# (moderate, high, severe). Clean scenes stay around 3-5 at every level
+NOISE_OUTLIER_THRESHOLDS = (8, 14, 30)
+# Entropy: variance of block entropy divided by the max entropy of a block
+# at that level, so the former single-scale 1.2 / 1.5 bits^2 thresholds for
+# 8-bit blocks are divided by 8^2 (moderate, significant)
+ENTROPY_VARIANCE_THRESHOLDS = (1.2 / 64, 1.5 / 64)
 
 
 def allowed_file(filename):
@@ -72,64 +95,172 @@ def error_level_analysis(image):
     return ela_image
 
 
-def convolve2d(image_array, kernel):
-    """Simple 2D convolution without scipy"""
-    # Try to use scipy if available (much faster)
-    try:
-        from scipy import signal
-        return signal.convolve2d(image_array, kernel, mode='same', boundary='symm')
-    except ImportError:
-        # Fallback to manual implementation
-        h, w = image_array.shape
-        kh, kw = kernel.shape
-        pad_h, pad_w = kh // 2, kw // 2
+def build_image_pyramid(image, min_dimension=PYRAMID_MIN_DIMENSION):
+    """
+    Build a grayscale image pyramid once per request, finest level first.
 
-        # Pad the image
-        padded = np.pad(image_array, ((pad_h, pad_h),
-                        (pad_w, pad_w)), mode='edge')
+    Coarser levels are strided views of the full-resolution level (every 2nd,
+    4th, ... pixel), so no pixel data is copied and per-pixel statistics such
+    as sensor noise and intensity histograms keep the same scale at every
+    level. Averaging would halve the noise per level and make levels
+    incomparable.
+    """
+    full = np.asarray(image.convert('L'), dtype=np.float32)
+    pyramid = [full]
 
-        # Initialize output
-        output = np.zeros_like(image_array)
+    step = 2
+    while min(full.shape) // step >= min_dimension:
+        pyramid.append(full[::step, ::step])
+        step *= 2
 
-        # Convolve
-        for i in range(h):
-            for j in range(w):
-                region = padded[i:i+kh, j:j+kw]
-                output[i, j] = np.sum(region * kernel)
+    return pyramid
 
-        return output
 
+def pyramid_block_size(level_index):
+    """Block size at a pyramid level, covering the same area at every level"""
+    return max(PYRAMID_BLOCK_SIZE >> level_index, 4)
 
-def noise_analysis(image):
-    """Analyze noise patterns"""
-    img_array = np.array(image.convert('L')).astype(float)
 
-    # High-pass filter kernel
-    kernel = np.array([[-1, -1, -1],
-                       [-1,  8, -1],
-                       [-1, -1, -1]], dtype=float)
+def split_blocks(level, block_size):
+    """Split a 2D array into non-overlapping blocks, one flattened block per row"""
+    h = level.shape[0] // block_size * block_size
+    w = level.shape[1] // block_size * block_size
+    blocks = level[:h, :w].reshape(h // block_size, block_size,
+                                   w // block_size, block_size)
+    return blocks.swapaxes(1, 2).reshape(-1, block_size * block_size)
 
-    # Apply filter
-    noise = convolve2d(img_array, kernel)
-    noise_std = np.std(noise)
-    noise_mean = np.mean(np.abs(noise))
 
-    # Analyze block variance
-    h, w = img_array.shape
-    block_size = 64
-    block_vars = []
+def overlapping_block_means(level, block_size):
+    """
+    Means of blocks placed every half block, so a small region is never
+    split across four blocks. Built from half-size block means.
+    """
+    half = block_size // 2
+    rows, cols = level.shape[0] // half, level.shape[1] // half
+    means = split_blocks(level, half).mean(axis=1).reshape(rows, cols)
+    return ((means[:-1, :-1] + means[1:, :-1] + means[:-1, 1:] + means[1:, 1:]) / 4).ravel()
+
+
+def high_pass_residual(level, step=1):
+    """
+    Apply the 3x3 high-pass kernel (8 at the center, -1 around it).
+    `step` spaces the kernel taps apart to respond to coarser detail.
+    """
+    h, w = level.shape
+    padded = np.pad(level, step, mode='edge')
+    neighborhood = sum(padded[i*step:i*step+h, j*step:j*step+w]
+                       for i in range(3) for j in range(3))
+    return 9 * level - neighborhood
+
+
+def block_entropies(blocks):
+    """Entropy of every block at once using a single offset histogram"""
+    values = np.clip(blocks, 0, 255).astype(np.intp)
+    n_blocks, block_pixels = values.shape
+    offsets = np.arange(n_blocks)[:, np.newaxis] * 256
+    hist = np.bincount((values + offsets).ravel(), minlength=n_blocks * 256)
+    hist = hist.reshape(n_blocks, 256) / block_pixels
+
+    log_hist = np.log2(hist, out=np.zeros_like(hist), where=hist > 0)
+    return -np.sum(hist * log_hist, axis=1)
+
+
+def noise_inconsistency(level, block_size=PYRAMID_BLOCK_SIZE):
+    """
+    Robust z-score of the most inconsistent flat blocks' noise level.
+
+    Blocks overlap by half so a small spliced region falls inside at least
+    one block. A block is flat when its residual energy does not grow with
+    the spaced-out kernel; white noise responds equally to both, while texture
+    and edges respond more to the spaced-out one and are skipped, as are
+    clipped blocks. Camera noise grows with brightness, so log2 noise
+    variance is fitted against log2 brightness and each block's deviation
+    from the fit is divided by the median absolute deviation, but never by
+    less than the expected estimation spread for the block size. Returns
+    the NOISE_OUTLIER_RANK-th largest score, or None when there are too few
+    flat blocks to judge.
+    """
+    noise_vars = overlapping_block_means(high_pass_residual(level) ** 2, block_size)
+    detail_vars = overlapping_block_means(high_pass_residual(level, step=2) ** 2, block_size)
+    noise_vars /= HIGH_PASS_KERNEL_ENERGY
+    detail_vars /= HIGH_PASS_KERNEL_ENERGY
+    brightness = overlapping_block_means(level, block_size)
+
+    flat = ((detail_vars <= NOISE_FLAT_RATIO * noise_vars + 1)
+            & (brightness > 2) & (brightness < 253))
+    if np.count_nonzero(flat) < max(NOISE_MIN_FLAT_BLOCKS, NOISE_OUTLIER_RANK):
+        return None
+
+    log_noise = np.log2(noise_vars[flat] + 1)
+    log_brightness = np.log2(brightness[flat] + 1)
+    design = np.stack([log_brightness, np.ones_like(log_brightness)], axis=1)
+    deviation = log_noise - design @ np.linalg.lstsq(design, log_noise, rcond=None)[0]
+
+    deviation = np.abs(deviation - np.median(deviation))
+    expected_spread = NOISE_ESTIMATE_SPREAD * PYRAMID_BLOCK_SIZE / block_size
+    spread = max(1.4826 * float(np.median(deviation)), expected_spread)
+    return float(np.sort(deviation)[-NOISE_OUTLIER_RANK] / spread)
+
+
+def entropy_variance(level, block_size=PYRAMID_BLOCK_SIZE):
+    """
+    Variance of local entropy across blocks, each divided by the maximum
+    entropy a block of this size can have (8 bits for 256+ pixels, 6 bits
+    for 8x8), so levels with smaller blocks give comparable values.
+    """
+    blocks = split_blocks(level, block_size)
+    if blocks.size == 0:
+        return 0.0
+    max_entropy = np.log2(min(256, blocks.shape[1]))
+    return float(np.var(block_entropies(blocks) / max_entropy))
+
+
+def coarse_to_fine(detector, levels, thresholds):
+    """
+    Evaluate `detector` from the coarsest level towards the finest one.
+
+    `levels` holds the detector arguments for each level, finest first.
+    Evaluation stops as soon as a level is clearly clean, i.e. below the
+    lowest scoring threshold by COARSE_TO_FINE_MARGIN. Anything else, as
+    well as levels the detector cannot judge, moves to a finer level, so
+    scores always come from the finest level evaluated and the expensive
+    full-resolution pass only runs when coarser levels are not clean.
+    Returns (value, levels_evaluated).
+    """
+    clean_below = thresholds[0] * (1 - COARSE_TO_FINE_MARGIN)
+    value = None
+    evaluated = 0
+
+    for args in reversed(levels):
+        evaluated += 1
+        level_value = detector(*args)
+        if level_value is None:
+            continue
+        value = level_value
+        if value <= clean_below:
+            break
 
-    for i in range(0, h - block_size, block_size):
-        for j in range(0, w - block_size, block_size):
-            block = img_array[i:i+block_size, j:j+block_size]
-            block_vars.append(np.var(block))
+    return (value if value is not None else 0.0), evaluated
 
-    variance_of_variances = np.var(block_vars) if block_vars else 0
+
+def multiscale_analysis(pyramid):
+    """
+    Run the noise and entropy detectors coarse-to-fine over the pyramid
+    """
+    levels = [(level, pyramid_block_size(i)) for i, level in enumerate(pyramid)]
+    noise_score, noise_levels = coarse_to_fine(
+        noise_inconsistency, levels, NOISE_OUTLIER_THRESHOLDS)
+    entropy_var, entropy_levels = coarse_to_fine(
+        entropy_variance, levels, ENTROPY_VARIANCE_THRESHOLDS)
 
     return {
-        'noise_std': float(noise_std),
-        'noise_mean': float(noise_mean),
-        'variance_inconsistency': float(variance_of_variances)
+        'noise_inconsistency': noise_score,
+        'noise_inconsistency_levels': noise_levels,
+        'entropy_variance': entropy_var,
+        'entropy_variance_levels': entropy_levels,
+        # Strided levels sample the same histogram at a fraction of the cost
+        'global_entropy': float(calculate_entropy(pyramid[-1])),
+        'pyramid_levels': len(pyramid),
     }
 
 
@@ -200,32 +331,6 @@ def calculate_entropy(data):
     return -np.sum(hist * np.log2(hist))
 
 
-def advanced_statistical_analysis(image):
-    """Additional statistical analysis"""
-    img_array = np.array(image.convert('L'))
-
-    # Calculate entropy
-    image_entropy = calculate_entropy(img_array.flatten())
-
-    # Analyze local entropy variations
-    h, w = img_array.shape
-    block_size = 32
-    local_entropies = []
-
-    for i in range(0, h - block_size, block_size):
-        for j in range(0, w - block_size, block_size):
-            block = img_array[i:i+block_size, j:j+block_size]
-            local_entropies.append(calculate_entropy(block.flatten()))
-
-    entropy_variance = float(np.var(local_entropies)
-                             ) if local_entropies else 0.0
-
-    return {
-        'global_entropy': float(image_entropy),
-        'entropy_variance': entropy_variance
-    }
-
-
 def extract_metadata(image):
     """Extract EXIF metadata"""
     metadata = {}
@@ -255,11 +360,12 @@ def analyze_image_quality(image):
     return metrics
 
 
-def calculate_tampering_score_multi_method(ela_image, noise_stats, ghost_stats,
-                                           jpeg_stats, stat_analysis, metadata, quality_metrics):
+def calculate_tampering_score_multi_method(ela_image, multiscale_stats, ghost_stats,
+                                           jpeg_stats, metadata, quality_metrics):
     """
-    V3: PHONE-PHOTO OPTIMIZED tampering detection
-    Even more relaxed thresholds to handle natural camera variations
+    V4: MULTI-SCALE tampering detection
+    Noise and entropy use scale-normalized pyramid statistics instead of
+    resolution-dependent raw variances
     """
     score = 0
     reasons = []
@@ -306,23 +412,27 @@ def calculate_tampering_score_multi_method(ela_image, noise_stats, ghost_stats,
 
     score += ela_score
 
-    # 2. NOISE ANALYSIS (25% weight) - V3.1 CUSTOM FOR YOUR PHONE
+    # 2. NOISE ANALYSIS (25% weight) - V4 SCALE-NORMALIZED
     noise_score = 0
-    # V3.1: EXTREME thresholds - modern phones have VERY high noise variance
-    # Your phone showed 572,908 - so we need much higher thresholds
-    if noise_stats['variance_inconsistency'] > 600000:  # Increased from 25000
+    # V4: Outlier score of flat blocks' noise level around the brightness
+    # fit. Clean photos stay around 3-5 regardless of texture; replaces the
+    # 200,000-600,000 raw variance thresholds that depended on resolution
+    # and content
+    noise_moderate, noise_high, noise_severe = NOISE_OUTLIER_THRESHOLDS
+    noise_outlier = multiscale_stats['noise_inconsistency']
+    if noise_outlier > noise_severe:
         noise_score = 25
         reasons.append(
-            f"Noise: Severe pattern inconsistencies (variance: {noise_stats['variance_inconsistency']:.0f})")
+            f"Noise: Severe pattern inconsistencies (outlier score: {noise_outlier:.1f})")
         confidence_factors.append("noise")
-    elif noise_stats['variance_inconsistency'] > 400000:  # Increased from 18000
+    elif noise_outlier > noise_high:
         noise_score = 15
         reasons.append(
-            f"Noise: High inconsistencies (variance: {noise_stats['variance_inconsistency']:.0f})")
-    elif noise_stats['variance_inconsistency'] > 200000:
+            f"Noise: High inconsistencies (outlier score: {noise_outlier:.1f})")
+    elif noise_outlier > noise_moderate:
         noise_score = 8
         reasons.append(
-            f"Noise: Moderate inconsistencies (variance: {noise_stats['variance_inconsistency']:.0f})")
+            f"Noise: Moderate inconsistencies (outlier score: {noise_outlier:.1f})")
 
     score += noise_score
 
@@ -352,14 +462,15 @@ def calculate_tampering_score_multi_method(ela_image, noise_stats, ghost_stats,
 
     score += djpeg_score
 
-    # 5. ENTROPY ANALYSIS (10% weight) - V3 RELAXED
+    # 5. ENTROPY ANALYSIS (10% weight) - V4 MULTI-SCALE
     entropy_score = 0
-    # V3: Much higher variance needed
-    if stat_analysis['entropy_variance'] > 1.5:  # Increased from 1.0
+    # V4: Normalized by max block entropy, thresholds rescaled to match
+    entropy_moderate, entropy_significant = ENTROPY_VARIANCE_THRESHOLDS
+    if multiscale_stats['entropy_variance'] > entropy_significant:
         entropy_score = 10
         reasons.append(f"Entropy: Significant density variations")
         confidence_factors.append("entropy")
-    elif stat_analysis['entropy_variance'] > 1.2:  # Increased from 0.7
+    elif multiscale_stats['entropy_variance'] > entropy_moderate:
         entropy_score = 5
         reasons.append(f"Entropy: Moderate variations")
 
@@ -433,9 +544,12 @@ def calculate_tampering_score_multi_method(ela_image, noise_stats, ghost_stats,
             'bright_pixels_120': f"{bright_120:.3f}%",
             'p95': f"{p95:.1f}",
             'p99': f"{p99:.1f}",
-            'noise_variance': f"{noise_stats['variance_inconsistency']:.1f}",
+            'noise_inconsistency': f"{multiscale_stats['noise_inconsistency']:.1f}",
             'ghost_variance': f"{ghost_stats['ghost_variance']:.2f}",
-            'entropy_variance': f"{stat_analysis['entropy_variance']:.3f}",
+            'entropy_variance': f"{multiscale_stats['entropy_variance']:.4f}",
+            'pyramid_levels': multiscale_stats['pyramid_levels'],
+            'noise_levels_evaluated': multiscale_stats['noise_inconsistency_levels'],
+            'entropy_levels_evaluated': multiscale_stats['entropy_variance_levels'],
             'block_artifact_std': f"{jpeg_stats['block_artifact_std']:.2f}"
         }
     }
@@ -496,11 +610,13 @@ def analyze_image():
         ela_image = error_level_analysis(image)
         logger.info(f"ELA completed in {time.time() - ela_start:.2f}s")
 
-        logger.info("Analyzing noise patterns...")
-        noise_start = time.time()
-        noise_stats = noise_analysis(image)
+        logger.info("Multi-scale noise and entropy analysis...")
+        multiscale_start = time.time()
+        pyramid = build_image_pyramid(image)
+        multiscale_stats = multiscale_analysis(pyramid)
         logger.info(
-            f"Noise analysis completed in {time.time() - noise_start:.2f}s")
+            f"Multi-scale analysis completed in {time.time() - multiscale_start:.2f}s "
+            f"({len(pyramid)} levels)")
 
         logger.info("Checking JPEG ghosts...")
         ghost_start = time.time()
@@ -514,12 +630,6 @@ def analyze_image():
         logger.info(
             f"Double JPEG detection completed in {time.time() - djpeg_start:.2f}s")
 
-        logger.info("Statistical analysis...")
-        stat_start = time.time()
-        stat_analysis = advanced_statistical_analysis(image)
-        logger.info(
-            f"Statistical analysis completed in {time.time() - stat_start:.2f}s")
-
         logger.info("Extracting metadata...")
         metadata = extract_metadata(image)
 
@@ -529,8 +639,8 @@ def analyze_image():
 
         logger.info("Calculating final score...")
         tampering_analysis = calculate_tampering_score_multi_method(
-            ela_image, noise_stats, ghost_stats, jpeg_stats,
-            stat_analysis, metadata, quality_metrics
+            ela_image, multiscale_stats, ghost_stats, jpeg_stats,
+            metadata, quality_metrics
         )
 
         # Add debug info
@@ -567,12 +677,11 @@ def analyze_image():
 def health_check():
     return jsonify({
         'status': 'healthy',
-        'version': 'phone-custom-v3.1',
+        'version': 'multiscale-v4',
         'improvements': [
-            'Custom tuned for modern phone cameras',
-            'Extreme noise variance tolerance (600,000+)',
-            'Tested on your specific phone model',
-            'Better handling of HDR and AI-enhanced photos'
+            'Multi-scale pyramid analysis with scale-normalized statistics',
+            'Noise measured on flat blocks only, independent of texture and brightness',
+            'Coarse-to-fine evaluation, fine levels only when not clearly clean'
         ]
     })
 
@@ -605,14 +714,13 @@ if __name__ == '__main__':
     os.environ['ENVIRONMENT'] = 'development'
 
     print("=" * 60)
-    print("Starting CUSTOM PHONE Image Tampering Detection Server V3.1")
+    print("Starting MULTI-SCALE Image Tampering Detection Server V4")
     print("=" * 60)
-    print("Optimizations for MODERN PHONES (HDR/AI Enhanced):")
-    print("  ✓ Extreme noise tolerance: 600,000+ (was 25,000)")
+    print("Detection thresholds:")
+    print(f"  ✓ Noise outlier score: {NOISE_OUTLIER_THRESHOLDS[-1]}+ (scale-normalized, was 600,000 variance)")
     print("  ✓ ELA brightness: 120+ at 5% (very strict)")
     print("  ✓ JPEG ghost: 15+ (relaxed)")
     print("  ✓ Tampering threshold: 65+ (strict)")
-    print("  ✓ Tested on your phone (variance: 572,908)")
     print("=" * 60)
 
     # Determine port dynamically
@@ -0,0 +1,443 @@
+"""
+Load-testing harness for the /api/analyze endpoint.
+
+Drives the analysis endpoint either in-process (one Flask test client per
+worker process, no network involved) or against a running server, sweeps a
+list of concurrency levels and reports throughput, latency percentiles,
+CPU and RSS per worker and the point where adding workers stops paying off.
+
+Examples:
+    python load_test.py --concurrency 1,2,4 --duration 10
+    python load_test.py --mix small:3,large:1 --json capacity.json
+    python load_test.py --url http://localhost:5000/api/analyze --server-pid 1234
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Synthetic image sizes (width, height). "large" exceeds the 1500px
+# preprocessing limit so the resize path is exercised as well.
+IMAGE_PROFILES = {
+    'small': (640, 480),
+    'medium': (1280, 960),
+    'large': (3000, 2250),
+}
+
+DEFAULT_MIX = 'small:1,medium:2,large:1'
+ANALYZE_PATH = '/api/analyze'
+# Extra seconds a worker gets on top of --duration for app import, warm-up
+# and its last in-flight request before it is considered hung
+WORKER_TIMEOUT_MARGIN = 120
+
+
+def make_test_image(width, height, seed=0):
+    """Create a JPEG with gradients and sensor-like noise"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width)
+    y = np.linspace(0, 255, height)
+    base = (x[np.newaxis, :] + y[:, np.newaxis]) / 2
+    img_array = np.stack([base, base[::-1], np.full_like(base, 128)], axis=-1)
+    img_array += rng.normal(0, 12, img_array.shape)
+    img_array = np.clip(img_array, 0, 255).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(img_array, 'RGB').save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def load_image_mix(mix, images_dir=None):
+    """
+    Build the weighted list of (filename, payload, weight) to send.
+    `mix` is "name:weight,..." using IMAGE_PROFILES names; files from
+    `images_dir` are added with weight 1 each.
+    """
+    images = []
+    if mix:
+        for seed, entry in enumerate(mix.split(',')):
+            name, _, weight = entry.strip().partition(':')
+            if name not in IMAGE_PROFILES:
+                raise ValueError(
+                    f"Unknown image profile '{name}'. Available: {', '.join(IMAGE_PROFILES)}")
+            width, height = IMAGE_PROFILES[name]
+            images.append((f'{name}.jpg', make_test_image(width, height, seed),
+                           float(weight) if weight else 1.0))
+
+    if images_dir:
+        for filename in sorted(os.listdir(images_dir)):
+            if filename.rsplit('.', 1)[-1].lower() in ('png', 'jpg', 'jpeg', 'webp'):
+                with open(os.path.join(images_dir, filename), 'rb') as f:
+                    images.append((filename, f.read(), 1.0))
+
+    if not images:
+        raise ValueError('Image mix is empty')
+    return images
+
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct)) if values else 0.0
+
+
+def peak_rss_kb():
+    """Peak resident set size of the current process in KB"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KB on Linux
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def read_proc_usage(pid):
+    """Return (cpu_seconds, rss_kb) for a process from /proc, or None"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # Fields after the command name, which may contain spaces
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/status') as f:
+            rss_kb = next(int(line.split()[1]) for line in f
+                          if line.startswith('VmRSS:'))
+    except (OSError, IndexError, StopIteration, ValueError):
+        return None
+
+    ticks = os.sysconf('SC_CLK_TCK')
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / ticks
+    return cpu_seconds, rss_kb
+
+
+def _pick_image(rng, images):
+    return rng.choices(images, weights=[weight for _, _, weight in images])[0]
+
+
+def _inprocess_worker(worker_id, images, duration, barrier, results):
+    """Run one worker process with its own Flask test client"""
+    import logging
+    # Silence per-request logging and prints so they don't skew timings
+    logging.disable(logging.CRITICAL)
+    sys.stdout = open(os.devnull, 'w')
+
+    from app import app
+    client = app.test_client()
+    rng = random.Random(worker_id)
+
+    def send(filename, payload):
+        response = client.post(ANALYZE_PATH,
+                               data={'image': (io.BytesIO(payload), filename)},
+                               content_type='multipart/form-data')
+        return response.status_code
+
+    # Warm up imports and caches before the clock starts
+    send(*_pick_image(rng, images)[:2])
+    barrier.wait(timeout=WORKER_TIMEOUT_MARGIN)
+
+    latencies = []
+    errors = 0
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    while time.perf_counter() < deadline:
+        filename, payload, _ = _pick_image(rng, images)
+        request_start = time.perf_counter()
+        status = send(filename, payload)
+        latencies.append(time.perf_counter() - request_start)
+        if status != 200:
+            errors += 1
+
+    results.put({
+        'worker': worker_id,
+        'latencies': latencies,
+        'errors': errors,
+        'wall_seconds': time.perf_counter() - start,
+        'cpu_seconds': time.process_time() - cpu_start,
+        'rss_kb': peak_rss_kb(),
+    })
+
+
+def run_inprocess(concurrency, images, duration):
+    """Run `concurrency` worker processes against the app in-process"""
+    ctx = multiprocessing.get_context()
+    barrier = ctx.Barrier(concurrency)
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_inprocess_worker,
+                           args=(i, images, duration, barrier, results))
+               for i in range(concurrency)]
+
+    for worker in workers:
+        worker.start()
+
+    worker_stats = []
+    deadline = time.monotonic() + duration + WORKER_TIMEOUT_MARGIN
+    try:
+        while len(worker_stats) < concurrency:
+            try:
+                worker_stats.append(results.get(timeout=1))
+                continue
+            except queue.Empty:
+                pass
+
+            failed = [f"worker {i} (exit code {w.exitcode})"
+                      for i, w in enumerate(workers)
+                      if w.exitcode is not None and w.exitcode != 0]
+            if failed:
+                raise RuntimeError(f"Worker(s) failed: {', '.join(failed)}")
+            if time.monotonic() > deadline:
+                raise RuntimeError(
+                    f"Timed out waiting for {concurrency - len(worker_stats)} worker(s)")
+    finally:
+        for worker in workers:
+            if worker.is_alive() and len(worker_stats) < concurrency:
+                worker.terminate()
+            worker.join()
+
+    return sorted(worker_stats, key=lambda w: w['worker'])
+
+
+def run_http(concurrency, images, duration, url, server_pids):
+    """Run `concurrency` client threads against a running server"""
+    import requests
+
+    barrier = threading.Barrier(concurrency + 1)
+    client_stats = [None] * concurrency
+
+    def client(worker_id):
+        latencies = []
+        errors = 0
+        started = False
+        try:
+            session = requests.Session()
+            rng = random.Random(worker_id)
+            barrier.wait(timeout=WORKER_TIMEOUT_MARGIN)
+            started = True
+            deadline = time.perf_counter() + duration
+
+            while time.perf_counter() < deadline:
+                filename, payload, _ = _pick_image(rng, images)
+                request_start = time.perf_counter()
+                try:
+                    response = session.post(url, files={'image': (filename, payload)},
+                                            timeout=WORKER_TIMEOUT_MARGIN)
+                    if response.status_code != 200:
+                        errors += 1
+                except requests.RequestException:
+                    errors += 1
+                latencies.append(time.perf_counter() - request_start)
+        except Exception:
+            # Count the failure and still report what was measured
+            errors += 1
+            if not started:
+                barrier.abort()
+            raise
+        finally:
+            client_stats[worker_id] = {'latencies': latencies, 'errors': errors}
+
+    threads = [threading.Thread(target=client, args=(i,))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    usage_before = {pid: read_proc_usage(pid) for pid in server_pids}
+    try:
+        barrier.wait(timeout=WORKER_TIMEOUT_MARGIN)
+    except threading.BrokenBarrierError:
+        pass  # A client failed before starting; it still reports its stats
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - start
+    usage_after = {pid: read_proc_usage(pid) for pid in server_pids}
+
+    # Requests are attributed to the clients; CPU and RSS to the server workers
+    worker_stats = [{'worker': i, 'latencies': s['latencies'], 'errors': s['errors'],
+                     'wall_seconds': wall_seconds, 'cpu_seconds': None, 'rss_kb': None}
+                    for i, s in enumerate(client_stats)]
+    server_stats = []
+    for pid in server_pids:
+        before, after = usage_before[pid], usage_after[pid]
+        if before is None or after is None:
+            print(f"WARNING: could not read /proc usage for server pid {pid}",
+                  file=sys.stderr)
+            continue
+        server_stats.append({'pid': pid,
+                             'cpu_seconds': after[0] - before[0],
+                             'rss_kb': after[1]})
+
+    return worker_stats, server_stats
+
+
+def summarize(concurrency, worker_stats, server_stats=None):
+    """Aggregate per-worker measurements for one concurrency level"""
+    latencies = [l for w in worker_stats for l in w['latencies']]
+    requests_done = len(latencies)
+    wall_seconds = max(w['wall_seconds'] for w in worker_stats)
+
+    if server_stats is None:
+        cpu_workers = [{'worker': w['worker'], 'cpu_seconds': w['cpu_seconds'],
+                        'rss_kb': w['rss_kb']} for w in worker_stats]
+    else:
+        cpu_workers = [{'worker': s['pid'], 'cpu_seconds': s['cpu_seconds'],
+                        'rss_kb': s['rss_kb']} for s in server_stats]
+
+    total_cpu = sum(w['cpu_seconds'] for w in cpu_workers)
+    for w in cpu_workers:
+        w['cpu_percent'] = 100.0 * w['cpu_seconds'] / wall_seconds if wall_seconds else 0.0
+
+    return {
+        'concurrency': concurrency,
+        'requests': requests_done,
+        'errors': sum(w['errors'] for w in worker_stats),
+        'wall_seconds': wall_seconds,
+        'requests_per_sec': requests_done / wall_seconds if wall_seconds else 0.0,
+        'latency_ms': {
+            'mean': 1000 * float(np.mean(latencies)) if latencies else 0.0,
+            'p50': 1000 * percentile(latencies, 50),
+            'p90': 1000 * percentile(latencies, 90),
+            'p95': 1000 * percentile(latencies, 95),
+            'p99': 1000 * percentile(latencies, 99),
+            'max': 1000 * max(latencies) if latencies else 0.0,
+        },
+        'cpu_seconds': total_cpu if cpu_workers else None,
+        # Throughput one fully busy core sustains at this level
+        'requests_per_core_sec': requests_done / total_cpu if total_cpu else None,
+        'workers': cpu_workers,
+    }
+
+
+def find_saturation(levels, min_gain=0.10):
+    """
+    Return the first concurrency level after which adding workers raises
+    throughput by less than `min_gain` (relative), or None if throughput
+    kept scaling across the sweep.
+    """
+    for previous, current in zip(levels, levels[1:]):
+        if previous['requests_per_sec'] == 0:
+            continue
+        gain = current['requests_per_sec'] / previous['requests_per_sec'] - 1
+        if gain < min_gain:
+            return previous['concurrency']
+    return None
+
+
+def build_report(levels, min_gain):
+    peak = max(levels, key=lambda level: level['requests_per_sec'])
+    per_core = [level['requests_per_core_sec'] for level in levels
+                if level['requests_per_core_sec']]
+    return {
+        'cpu_count': os.cpu_count(),
+        'levels': levels,
+        'peak_requests_per_sec': peak['requests_per_sec'],
+        'peak_concurrency': peak['concurrency'],
+        'saturation_concurrency': find_saturation(levels, min_gain),
+        'capacity_per_core': max(per_core) if per_core else None,
+    }
+
+
+def print_report(report):
+    print("=" * 78)
+    print(f"{'conc':>5} {'reqs':>6} {'err':>4} {'req/s':>8} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'p99 ms':>8} {'req/core-s':>11} {'max RSS MB':>11}")
+    print("-" * 78)
+    for level in report['levels']:
+        latency = level['latency_ms']
+        per_core = level['requests_per_core_sec']
+        rss = [w['rss_kb'] for w in level['workers'] if w['rss_kb']]
+        print(f"{level['concurrency']:>5} {level['requests']:>6} {level['errors']:>4} "
+              f"{level['requests_per_sec']:>8.2f} {latency['p50']:>8.1f} "
+              f"{latency['p95']:>8.1f} {latency['p99']:>8.1f} "
+              f"{per_core if per_core else 0:>11.2f} "
+              f"{max(rss) / 1024 if rss else 0:>11.1f}")
+    print("-" * 78)
+
+    for level in report['levels']:
+        for w in level['workers']:
+            rss = f"{w['rss_kb'] / 1024:.1f}MB" if w['rss_kb'] else 'n/a'
+            print(f"  conc={level['concurrency']} worker {w['worker']}: "
+                  f"cpu {w['cpu_seconds']:.2f}s ({w['cpu_percent']:.0f}%), rss {rss}")
+
+    print("-" * 78)
+    print(f"CPU cores: {report['cpu_count']}")
+    print(f"Peak throughput: {report['peak_requests_per_sec']:.2f} req/s "
+          f"at concurrency {report['peak_concurrency']}")
+    if report['saturation_concurrency'] is None:
+        print("Saturation: not reached, throughput still scaling")
+    else:
+        print(f"Saturation: concurrency {report['saturation_concurrency']}")
+    if report['capacity_per_core']:
+        print(f"Capacity per core: {report['capacity_per_core']:.2f} req/s")
+    print("=" * 78)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Load test the /api/analyze endpoint')
+    parser.add_argument('--concurrency', default='1,2,4',
+                        help='Comma-separated worker counts to sweep (default: 1,2,4)')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='Seconds to run each concurrency level (default: 10)')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f'Synthetic image mix as name:weight (default: {DEFAULT_MIX})')
+    parser.add_argument('--images-dir',
+                        help='Directory of real images to add to the mix')
+    parser.add_argument('--url',
+                        help='Target a running server instead of the in-process test client')
+    parser.add_argument('--server-pid', type=int, action='append', default=[],
+                        help='Server worker pid to sample CPU/RSS from (repeatable, --url only)')
+    parser.add_argument('--saturation-gain', type=float, default=0.10,
+                        help='Minimum relative throughput gain per level before '
+                             'calling it saturated (default: 0.10)')
+    parser.add_argument('--json', help='Write the full report to this file')
+    args = parser.parse_args(argv)
+    if args.server_pid and not args.url:
+        parser.error('--server-pid requires --url')
+
+    levels_to_run = [int(c) for c in args.concurrency.split(',')]
+    images = load_image_mix(args.mix, args.images_dir)
+    target = args.url or 'in-process test client'
+    print(f"Load testing {target} with {len(images)} image(s), "
+          f"{args.duration:.0f}s per level")
+
+    levels = []
+    for concurrency in levels_to_run:
+        print(f"Running concurrency {concurrency}...")
+        if args.url:
+            worker_stats, server_stats = run_http(
+                concurrency, images, args.duration, args.url, args.server_pid)
+            levels.append(summarize(concurrency, worker_stats, server_stats))
+        else:
+            try:
+                worker_stats = run_inprocess(concurrency, images, args.duration)
+            except RuntimeError as e:
+                print(f"ERROR at concurrency {concurrency}: {e}", file=sys.stderr)
+                break
+            levels.append(summarize(concurrency, worker_stats))
+
+    if not levels:
+        print("No concurrency level completed", file=sys.stderr)
+        sys.exit(1)
+
+    report = build_report(levels, args.saturation_gain)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import multiprocessing
+import sys
+
+import pytest
+
+import load_test
+
+
+def make_level(concurrency, requests_per_sec):
+    return {'concurrency': concurrency, 'requests_per_sec': requests_per_sec}
+
+
+def make_worker(worker, latencies, cpu_seconds=None, rss_kb=None, errors=0,
+                wall_seconds=2.0):
+    return {'worker': worker, 'latencies': latencies, 'errors': errors,
+            'wall_seconds': wall_seconds, 'cpu_seconds': cpu_seconds,
+            'rss_kb': rss_kb}
+
+
+def test_find_saturation_flat_throughput():
+    levels = [make_level(1, 10.0), make_level(2, 19.0), make_level(4, 20.0)]
+    assert load_test.find_saturation(levels) == 2
+
+
+def test_find_saturation_still_scaling():
+    levels = [make_level(1, 10.0), make_level(2, 19.0), make_level(4, 36.0)]
+    assert load_test.find_saturation(levels) is None
+
+
+def test_find_saturation_single_level():
+    assert load_test.find_saturation([make_level(1, 10.0)]) is None
+
+
+def test_find_saturation_skips_zero_throughput():
+    levels = [make_level(1, 0.0), make_level(2, 5.0), make_level(4, 5.1)]
+    assert load_test.find_saturation(levels) == 2
+
+
+def test_find_saturation_custom_gain():
+    levels = [make_level(1, 10.0), make_level(2, 12.0)]
+    assert load_test.find_saturation(levels, min_gain=0.10) is None
+    assert load_test.find_saturation(levels, min_gain=0.50) == 1
+
+
+def test_summarize_inprocess():
+    workers = [make_worker(0, [0.1, 0.2, 0.3], cpu_seconds=1.0, rss_kb=2048),
+               make_worker(1, [0.4], cpu_seconds=1.0, rss_kb=4096, errors=1)]
+    level = load_test.summarize(2, workers)
+
+    assert level['requests'] == 4
+    assert level['errors'] == 1
+    assert level['requests_per_sec'] == pytest.approx(2.0)
+    assert level['latency_ms']['max'] == pytest.approx(400.0)
+    assert level['cpu_seconds'] == pytest.approx(2.0)
+    assert level['requests_per_core_sec'] == pytest.approx(2.0)
+    assert [w['cpu_percent'] for w in level['workers']] == [50.0, 50.0]
+
+
+def test_summarize_http_without_server_pids():
+    workers = [make_worker(0, [0.1, 0.2]), make_worker(1, [])]
+    level = load_test.summarize(2, workers, server_stats=[])
+
+    assert level['requests'] == 2
+    assert level['workers'] == []
+    assert level['cpu_seconds'] is None
+    assert level['requests_per_core_sec'] is None
+
+
+def test_summarize_http_with_server_pids():
+    workers = [make_worker(0, [0.1, 0.2])]
+    server_stats = [{'pid': 42, 'cpu_seconds': 1.0, 'rss_kb': 1024}]
+    level = load_test.summarize(1, workers, server_stats)
+
+    assert level['workers'][0]['worker'] == 42
+    assert level['requests_per_core_sec'] == pytest.approx(2.0)
+
+
+def test_summarize_no_requests():
+    level = load_test.summarize(1, [make_worker(0, [], cpu_seconds=0.0)])
+
+    assert level['requests'] == 0
+    assert level['latency_ms']['p99'] == 0.0
+    assert level['requests_per_core_sec'] is None
+
+
+def test_load_image_mix_weights():
+    images = load_test.load_image_mix('small:3,medium')
+
+    assert [(name, weight) for name, _, weight in images] == [
+        ('small.jpg', 3.0), ('medium.jpg', 1.0)]
+    assert all(payload[:2] == b'\xff\xd8' for _, payload, _ in images)
+
+
+def test_load_image_mix_unknown_profile():
+    with pytest.raises(ValueError, match='Unknown image profile'):
+        load_test.load_image_mix('huge:1')
+
+
+def test_load_image_mix_empty():
+    with pytest.raises(ValueError, match='empty'):
+        load_test.load_image_mix('')
+
+
+def test_load_image_mix_images_dir(tmp_path):
+    (tmp_path / 'photo.JPG').write_bytes(b'jpeg')
+    (tmp_path / 'notes.txt').write_bytes(b'text')
+    images = load_test.load_image_mix('', str(tmp_path))
+
+    assert images == [('photo.JPG', b'jpeg', 1.0)]
+
+
+def test_server_pid_requires_url():
+    with pytest.raises(SystemExit):
+        load_test.main(['--server-pid', '1234'])
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason='needs forked workers to inherit the broken import')
+def test_run_inprocess_reports_failed_workers(monkeypatch):
+    # Workers fail to import the app and must be reported, not waited on
+    monkeypatch.setitem(sys.modules, 'app', None)
+    with pytest.raises(RuntimeError, match='failed'):
+        load_test.run_inprocess(2, load_test.load_image_mix('small'), 1)
+
+
+def test_run_http_passes_request_timeout(monkeypatch):
+    import requests
+
+    timeouts = []
+
+    def stalled_post(self, url, timeout=None, **kwargs):
+        timeouts.append(timeout)
+        raise requests.Timeout('stalled')
+
+    monkeypatch.setattr(requests.Session, 'post', stalled_post)
+    worker_stats, _ = load_test.run_http(
+        1, load_test.load_image_mix('small'), 0.2, 'http://localhost:1', [])
+
+    assert timeouts and set(timeouts) == {load_test.WORKER_TIMEOUT_MARGIN}
+    assert worker_stats[0]['errors'] == len(worker_stats[0]['latencies']) > 0
@@ -0,0 +1,203 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import app
+
+HEIGHT, WIDTH = 1125, 1500  # Largest size after preprocess_image
+
+
+def to_jpeg_image(gray):
+    """Round-trip a grayscale array through JPEG like an uploaded photo"""
+    rgb = np.clip(np.stack([gray] * 3, axis=-1), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(rgb, 'RGB').save(buffer, 'JPEG', quality=90)
+    buffer.seek(0)
+    return Image.open(buffer).convert('RGB')
+
+
+def make_scene(textured=False, splice_size=0, splice_noise=3, seed=0):
+    """Gradient (or sky over textured ground) with uniform sensor noise.
+    `splice_size` pastes a square with `splice_noise` times the noise
+    standard deviation into the sky."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:HEIGHT, 0:WIDTH].astype(float)
+
+    if textured:
+        sky = 200 - y / HEIGHT * 60
+        ground = (100 + 35 * np.sin(x / 5.3 + 3 * np.sin(y / 17)) * np.cos(y / 4.1)
+                  + 20 * np.sin(x / 31))
+        scene = np.where(y < HEIGHT * 0.45, sky, ground)
+    else:
+        scene = x / WIDTH * 120 + y / HEIGHT * 80 + 30
+
+    noise = rng.normal(0, 6, scene.shape)
+    if splice_size:
+        half = splice_size // 2
+        spliced = (abs(x - 700) < half) & (abs(y - 250) < half)
+        noise = np.where(spliced, splice_noise * noise, noise)
+
+    return to_jpeg_image(scene + noise)
+
+
+def test_split_blocks_ordering():
+    level = np.arange(30).reshape(5, 6)
+    blocks = app.split_blocks(level, 2)
+
+    # Row-major over blocks, row-major inside each block, remainder dropped
+    assert blocks.shape == (6, 4)
+    assert blocks[0].tolist() == [0, 1, 6, 7]
+    assert blocks[1].tolist() == [2, 3, 8, 9]
+    assert blocks[3].tolist() == [12, 13, 18, 19]
+
+
+def test_block_entropies_match_calculate_entropy():
+    rng = np.random.default_rng(0)
+    level = rng.integers(0, 256, (96, 64)).astype(np.float32)
+    level[:32, :32] = 7  # A constant block has zero entropy
+    blocks = app.split_blocks(level, 32)
+
+    expected = [app.calculate_entropy(block) for block in blocks]
+    assert app.block_entropies(blocks) == pytest.approx(expected)
+
+
+def test_overlapping_block_means_step_half_a_block():
+    level = np.arange(48, dtype=float).reshape(6, 8)
+    means = app.overlapping_block_means(level, 4)
+
+    # 4x4 blocks every 2 pixels: a 2x3 grid
+    expected = [level[i:i + 4, j:j + 4].mean() for i in (0, 2) for j in (0, 2, 4)]
+    assert means == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('step', [1, 2])
+def test_high_pass_residual_matches_kernel(step):
+    rng = np.random.default_rng(0)
+    level = rng.normal(100, 20, (12, 15))
+    kernel = np.array([[-1, -1, -1],
+                       [-1,  8, -1],
+                       [-1, -1, -1]], dtype=float)
+
+    padded = np.pad(level, step, mode='edge')
+    expected = np.zeros_like(level)
+    for i in range(level.shape[0]):
+        for j in range(level.shape[1]):
+            window = padded[i:i + 2 * step + 1:step, j:j + 2 * step + 1:step]
+            expected[i, j] = np.sum(window * kernel)
+
+    assert app.high_pass_residual(level, step) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('size, shapes', [
+    ((640, 480), [(480, 640)]),
+    ((1500, 1125), [(1125, 1500), (563, 750), (282, 375)]),
+])
+def test_pyramid_depth(size, shapes):
+    pyramid = app.build_image_pyramid(Image.new('RGB', size))
+
+    assert [level.shape for level in pyramid] == shapes
+    # Coarser levels are views of the full-resolution buffer
+    assert all(np.shares_memory(level, pyramid[0]) for level in pyramid)
+
+
+def test_pyramid_block_size_covers_same_area():
+    assert [app.pyramid_block_size(i) for i in range(3)] == [32, 16, 8]
+
+
+def test_entropy_variance_is_normalized():
+    level = np.zeros((64, 64))
+    level[:, 32:] = np.arange(64 * 32).reshape(64, 32) % 256
+
+    # Half constant blocks (0 bits), half uniform (8 bits, the maximum)
+    assert app.entropy_variance(level) == pytest.approx(0.25)
+
+
+def test_coarse_to_fine_stops_when_clearly_clean():
+    calls = []
+
+    def detector(level):
+        calls.append(level)
+        return 0.0
+
+    levels = [('fine',), ('mid',), ('coarse',)]
+    value, evaluated = app.coarse_to_fine(detector, levels, (0.5, 1.0))
+    assert (value, evaluated) == (0.0, 1)
+    assert calls == ['coarse']
+
+
+def test_coarse_to_fine_skips_undecidable_levels():
+    values = {'fine': 0.3, 'mid': 0.25, 'coarse': None}
+    levels = [('fine',), ('mid',), ('coarse',)]
+    value, evaluated = app.coarse_to_fine(values.get, levels, (0.5, 1.0))
+    assert (value, evaluated) == (0.3, 3)
+
+
+def level_values(detector, image):
+    pyramid = app.build_image_pyramid(image)
+    return [detector(level, app.pyramid_block_size(i)) for i, level in enumerate(pyramid)]
+
+
+def noise_score(image):
+    stats = app.multiscale_analysis(app.build_image_pyramid(image))
+    result = app.calculate_tampering_score_multi_method(
+        app.error_level_analysis(image), stats,
+        {'ghost_variance': 0.0}, {'block_artifact_std': 0.0}, {}, {})
+    return stats, result['detection_methods']['noise_score']
+
+
+@pytest.mark.parametrize('textured', [False, True])
+def test_clean_noise_stays_under_moderate_at_every_level(textured):
+    values = level_values(app.noise_inconsistency, make_scene(textured=textured))
+    assert all(value < app.NOISE_OUTLIER_THRESHOLDS[0] for value in values)
+
+
+def test_entropy_variance_comparable_across_levels():
+    values = level_values(app.entropy_variance, make_scene(textured=True))
+
+    assert values[0] > 0.005
+    assert values[1:] == pytest.approx([values[0]] * 2, rel=0.3)
+
+
+def test_clean_image_stops_at_coarsest_level(monkeypatch):
+    image = make_scene()
+    residual_shapes = []
+    high_pass_residual = app.high_pass_residual
+
+    def recording_residual(level, step=1):
+        residual_shapes.append(level.shape)
+        return high_pass_residual(level, step)
+
+    monkeypatch.setattr(app, 'high_pass_residual', recording_residual)
+    stats = app.multiscale_analysis(app.build_image_pyramid(image))
+
+    assert stats['pyramid_levels'] == 3
+    assert stats['noise_inconsistency_levels'] == 1
+    assert stats['entropy_variance_levels'] == 1
+    assert stats['noise_inconsistency'] < app.NOISE_OUTLIER_THRESHOLDS[0]
+    # No full-resolution residual is computed for a clearly clean image
+    assert (HEIGHT, WIDTH) not in residual_shapes
+
+
+@pytest.mark.parametrize('splice_size, splice_noise', [(32, 3), (64, 10), (200, 3)])
+def test_small_splice_reaches_finest_level_and_scores(splice_size, splice_noise):
+    stats, score = noise_score(make_scene(splice_size=splice_size,
+                                          splice_noise=splice_noise))
+
+    assert stats['noise_inconsistency_levels'] == stats['pyramid_levels'] == 3
+    assert score > 0
+
+
+def test_clean_textured_photo_stays_under_moderate_threshold():
+    stats, score = noise_score(make_scene(textured=True))
+
+    assert stats['noise_inconsistency'] < app.NOISE_OUTLIER_THRESHOLDS[0]
+    assert score == 0
+
+
+def test_large_splice_scores_high():
+    stats, score = noise_score(make_scene(splice_size=400))
+
+    assert stats['noise_inconsistency'] > app.NOISE_OUTLIER_THRESHOLDS[1]
+    assert score >= 15